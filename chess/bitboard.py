@@ -0,0 +1,260 @@
+import random
+from typing import Iterator
+
+# Squares are numbered row by row from the top of the board: square `row * 8 + col` is bit `1 << (row * 8 + col)`.
+# A Chess board is a tuple of twelve piece bitboards followed by a mask of the king/rook squares that have not moved.
+WHITE_PAWNS, WHITE_KNIGHTS, WHITE_BISHOPS, WHITE_ROOKS, WHITE_QUEENS, WHITE_KING = range(0, 6)
+BLACK_PAWNS, BLACK_KNIGHTS, BLACK_BISHOPS, BLACK_ROOKS, BLACK_QUEENS, BLACK_KING = range(6, 12)
+UNMOVED: int = 12
+
+FULL_BOARD: int = (1 << 64) - 1
+A_FILE: int = 0x0101010101010101
+H_FILE: int = A_FILE << 7
+NOT_A_FILE: int = FULL_BOARD & ~A_FILE
+NOT_H_FILE: int = FULL_BOARD & ~H_FILE
+
+KNIGHT_OFFSETS: tuple[tuple[int, int], ...] = ((2, 1), (2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2), (-2, 1), (-2, -1))
+KING_OFFSETS: tuple[tuple[int, int], ...] = ((0, 1), (0, -1), (-1, 0), (1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+# Ray directions as (row change, col change): east, west, north, south, then the four diagonals.
+DIRECTIONS: tuple[tuple[int, int], ...] = ((0, 1), (0, -1), (-1, 0), (1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+def square_bit(row: int, col: int) -> int:
+    '''
+    Get the bit of a square, or 0 if the square is off the board.
+
+    Parameters:
+        row (int): Row of the square.
+        col (int): Column of the square.
+
+    Returns:
+        int: The square's bit.
+    '''
+
+    if 0 <= row <= 7 and 0 <= col <= 7:
+        return 1 << (row * 8 + col)
+    return 0
+
+def iterate_squares(bitboard: int) -> Iterator[int]:
+    '''
+    Iterate over the squares set in a bitboard, lowest square first.
+
+    Parameters:
+        bitboard (int): The bitboard to iterate over.
+
+    Returns:
+        Iterator[int]: The index of every set square.
+    '''
+
+    while bitboard:
+        bit: int = bitboard & -bitboard
+        yield bit.bit_length() - 1
+        bitboard ^= bit
+
+def get_occupancy(board: tuple[int, ...], player: int) -> int:
+    '''
+    Get every square occupied by `player`.
+
+    Parameters:
+        board (tuple[int, ...]): Bitboard representation of the board.
+        player (int): The player in question.
+
+    Returns:
+        int: Bitboard of `player`'s pieces.
+    '''
+
+    start: int = 6 * (player - 1)
+    return board[start] | board[start + 1] | board[start + 2] | board[start + 3] | board[start + 4] | board[start + 5]
+
+def to_mailbox(board: tuple[int, ...] | list[int]) -> bytearray:
+    '''
+    Convert a board to a flat mailbox: one byte per square, holding 0 for an empty square or the index of the
+    occupying piece's bitboard plus 1.
+
+    Parameters:
+        board (tuple[int, ...] | list[int]): Bitboard representation of the board.
+
+    Returns:
+        bytearray: The 64-byte mailbox.
+    '''
+
+    mailbox: bytearray = bytearray(64)
+    for index in range(UNMOVED):
+        for square in iterate_squares(board[index]):
+            mailbox[square] = index + 1
+
+    return mailbox
+
+def _build_offset_attacks(offsets: tuple[tuple[int, int], ...]) -> tuple[int, ...]:
+    return tuple(
+        sum(square_bit(square // 8 + row_change, square % 8 + col_change) for row_change, col_change in offsets)
+        for square in range(64)
+    )
+
+def _build_pawn_attacks(forward: int) -> tuple[int, ...]:
+    if forward < 0:
+        return tuple(((1 << square >> 9) & NOT_H_FILE) | ((1 << square >> 7) & NOT_A_FILE) for square in range(64))
+    return tuple(((1 << square << 7) & NOT_H_FILE) | ((1 << square << 9) & NOT_A_FILE) for square in range(64))
+
+def _build_ray(square: int, direction: tuple[int, int]) -> list[int]:
+    bits: list[int] = []
+    row: int = square // 8 + direction[0]
+    col: int = square % 8 + direction[1]
+    while square_bit(row, col):
+        bits.append(square_bit(row, col))
+        row += direction[0]
+        col += direction[1]
+
+    return bits
+
+def _build_between(square: int) -> tuple[int, ...]:
+    # For every other square on a line with `square`, the squares strictly between the two.
+    between: list[int] = [0] * 64
+    for row_change, col_change in DIRECTIONS:
+        path: int = 0
+        row: int = square // 8 + row_change
+        col: int = square % 8 + col_change
+        while square_bit(row, col):
+            between[row * 8 + col] = path
+            path |= square_bit(row, col)
+            row += row_change
+            col += col_change
+
+    return tuple(between)
+
+def _build_ray_attacks(bits: list[int]) -> dict[int, int]:
+    # Enumerate every subset of blockers on the ray and record the squares reachable up to the first blocker.
+    mask: int = sum(bits)
+    table: dict[int, int] = {}
+    blockers: int = 0
+    while True:
+        attacks: int = 0
+        for bit in bits:
+            attacks |= bit
+            if blockers & bit:
+                break
+        table[blockers] = attacks
+
+        blockers = (blockers - mask) & mask
+        if blockers == 0:
+            return table
+
+KNIGHT_ATTACKS: tuple[int, ...] = _build_offset_attacks(KNIGHT_OFFSETS)
+KING_ATTACKS: tuple[int, ...] = _build_offset_attacks(KING_OFFSETS)
+PAWN_ATTACKS: tuple[tuple[int, ...], ...] = (_build_pawn_attacks(-1), _build_pawn_attacks(1))
+
+_RAY_BITS: list[list[list[int]]] = [[_build_ray(square, direction) for square in range(64)] for direction in DIRECTIONS]
+RAYS: tuple[tuple[int, ...], ...] = tuple(tuple(sum(bits) for bits in rays) for rays in _RAY_BITS)
+RAY_ATTACKS: tuple[tuple[dict[int, int], ...], ...] = tuple(tuple(_build_ray_attacks(bits) for bits in rays) for rays in _RAY_BITS)
+
+# Every square on an orthogonal / diagonal line through each square, ignoring blockers.
+ROOK_LINES: tuple[int, ...] = tuple(RAYS[0][square] | RAYS[1][square] | RAYS[2][square] | RAYS[3][square] for square in range(64))
+BISHOP_LINES: tuple[int, ...] = tuple(RAYS[4][square] | RAYS[5][square] | RAYS[6][square] | RAYS[7][square] for square in range(64))
+BETWEEN: tuple[tuple[int, ...], ...] = tuple(_build_between(square) for square in range(64))
+
+# The direction loop is unrolled into one lookup per ray; this is the hottest code in move generation.
+_EAST, _WEST, _NORTH, _SOUTH, _SOUTH_EAST, _SOUTH_WEST, _NORTH_EAST, _NORTH_WEST = RAY_ATTACKS
+_EAST_RAY, _WEST_RAY, _NORTH_RAY, _SOUTH_RAY, _SOUTH_EAST_RAY, _SOUTH_WEST_RAY, _NORTH_EAST_RAY, _NORTH_WEST_RAY = RAYS
+
+def rook_attacks(square: int, occupied: int) -> int:
+    '''
+    Get the squares attacked by a rook.
+
+    Parameters:
+        square (int): Square of the rook.
+        occupied (int): Bitboard of every occupied square.
+
+    Returns:
+        int: Bitboard of attacked squares, including the first blocker in each direction.
+    '''
+
+    return (_EAST[square][occupied & _EAST_RAY[square]] | _WEST[square][occupied & _WEST_RAY[square]]
+            | _NORTH[square][occupied & _NORTH_RAY[square]] | _SOUTH[square][occupied & _SOUTH_RAY[square]])
+
+def bishop_attacks(square: int, occupied: int) -> int:
+    '''
+    Get the squares attacked by a bishop.
+
+    Parameters:
+        square (int): Square of the bishop.
+        occupied (int): Bitboard of every occupied square.
+
+    Returns:
+        int: Bitboard of attacked squares, including the first blocker in each direction.
+    '''
+
+    return (_SOUTH_EAST[square][occupied & _SOUTH_EAST_RAY[square]] | _SOUTH_WEST[square][occupied & _SOUTH_WEST_RAY[square]]
+            | _NORTH_EAST[square][occupied & _NORTH_EAST_RAY[square]] | _NORTH_WEST[square][occupied & _NORTH_WEST_RAY[square]])
+
+# Killer squares: for (attacking player, attacked square), the square of the slider which last attacked it.
+# While a king is in check, most candidate moves leave it attacked by the same piece, so that piece is tried first.
+KILLER_SQUARES: dict[tuple[int, int], int] = {}
+
+def is_attacked(board: tuple[int, ...] | list[int], square: int, by_player: int) -> bool:
+    '''
+    Determine whether `square` is attacked by any of `by_player`'s pieces, by looking outward from the square.
+
+    Parameters:
+        board (tuple[int, ...] | list[int]): Bitboard representation of the board.
+        square (int): The square in question.
+        by_player (int): The attacking player.
+
+    Returns:
+        bool: Whether `square` is attacked or not.
+    '''
+
+    start: int = 6 * (by_player - 1)
+    pawns, knights, bishops, rooks, queens, king = board[start:start + 6]
+
+    if PAWN_ATTACKS[2 - by_player][square] & pawns or KNIGHT_ATTACKS[square] & knights or KING_ATTACKS[square] & king:
+        return True
+
+    # Only sliders on a line through the square can attack it; most of the time there are none and the blocker lookups are skipped.
+    rook_sliders: int = (rooks | queens) & ROOK_LINES[square]
+    bishop_sliders: int = (bishops | queens) & BISHOP_LINES[square]
+    if not rook_sliders and not bishop_sliders:
+        return False
+
+    occupied: int = get_occupancy(board, 1) | get_occupancy(board, 2)
+
+    # A slider still on the killer square attacks through an empty line without any ray lookups.
+    killer: int | None = KILLER_SQUARES.get((by_player, square))
+    if killer is not None and (rook_sliders | bishop_sliders) >> killer & 1 and not BETWEEN[square][killer] & occupied:
+        return True
+
+    attackers: int = rook_attacks(square, occupied) & rook_sliders if rook_sliders else 0
+    if not attackers and bishop_sliders:
+        attackers = bishop_attacks(square, occupied) & bishop_sliders
+    if attackers:
+        KILLER_SQUARES[(by_player, square)] = (attackers & -attackers).bit_length() - 1
+        return True
+
+    return False
+
+# Zobrist keys: a state's hash is the XOR of the keys of its pieces, its unmoved squares and (for player 2) the player key.
+# Generated from a fixed seed so that every process agrees on the hash of a state.
+_zobrist_random: random.Random = random.Random(0)
+ZOBRIST_PIECES: tuple[tuple[int, ...], ...] = tuple(tuple(_zobrist_random.getrandbits(64) for _ in range(64)) for _ in range(UNMOVED))
+ZOBRIST_UNMOVED: tuple[int, ...] = tuple(_zobrist_random.getrandbits(64) for _ in range(64))
+ZOBRIST_PLAYER: int = _zobrist_random.getrandbits(64)
+
+def zobrist_hash(board: tuple[int, ...] | list[int], player: int) -> int:
+    '''
+    Compute the Zobrist hash of a board from scratch.
+
+    Parameters:
+        board (tuple[int, ...] | list[int]): Bitboard representation of the board.
+        player (int): Whose turn it is.
+
+    Returns:
+        int: The 64-bit Zobrist hash.
+    '''
+
+    key: int = ZOBRIST_PLAYER if player == 2 else 0
+    for index in range(UNMOVED):
+        for square in iterate_squares(board[index]):
+            key ^= ZOBRIST_PIECES[index][square]
+    for square in iterate_squares(board[UNMOVED]):
+        key ^= ZOBRIST_UNMOVED[square]
+
+    return key
\ No newline at end of file
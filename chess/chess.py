@@ -1,70 +1,177 @@
-from state import State
-from chess.piece import Piece, King, Queen, Rook, Knight, Bishop, Pawn
-from typing import Type
+import numpy as np
+from mcts.state import State
+from chess.bitboard import UNMOVED, ZOBRIST_PIECES, ZOBRIST_PLAYER, ZOBRIST_UNMOVED, is_attacked, iterate_squares, to_mailbox, zobrist_hash
+from chess.piece import PIECE_TYPES, Piece, King, Queen, Rook, Knight, Bishop, Pawn, get_piece
+from typing import Sequence
+from weakref import WeakValueDictionary
+
+def board_from_grid(grid: list[list[Piece | None]]) -> tuple[int, ...]:
+    '''
+    Convert an 8x8 grid of pieces into a bitboard representation. Every king and rook on the grid is treated as unmoved.
+
+    Parameters:
+        grid (list[list[Piece | None]]): The board as rows of pieces, top row first.
+
+    Returns:
+        tuple[int, ...]: Twelve piece bitboards followed by the mask of unmoved king/rook squares.
+    '''
+
+    board: list[int] = [0] * (UNMOVED + 1)
+    for row in range(8):
+        for col in range(8):
+            piece: Piece | None = grid[row][col]
+            if piece is not None:
+                board[piece.index] |= 1 << (row * 8 + col)
+                if isinstance(piece, (King, Rook)):
+                    board[UNMOVED] |= 1 << (row * 8 + col)
+
+    return tuple(board)
+
+def _popcount(bitboards: np.ndarray) -> np.ndarray:
+    '''
+    Count the set bits of every bitboard in a uint64 array; for NumPy before 2.0, which has no np.bitwise_count.
+
+    Parameters:
+        bitboards (np.ndarray): Array of shape (n, m) and dtype uint64.
+
+    Returns:
+        np.ndarray: Array of shape (n, m) holding the number of set bits of each bitboard.
+    '''
+
+    bits: np.ndarray = np.unpackbits(bitboards.view(np.uint8), axis=1)
+    return bits.reshape(bitboards.shape[0], bitboards.shape[1], 64).sum(axis=-1)
+
+popcount = getattr(np, 'bitwise_count', _popcount)
+
+# Live Chess states by Zobrist hash, so a position reached through different move orders is only built once.
+TRANSPOSITION_TABLE: 'WeakValueDictionary[int, Chess]' = WeakValueDictionary()
 
 class Chess(State):
     '''
     A representation of a Chess game state.
 
     Attributes:
-        representation (list[list[Piece | None]]): The representation of the game state.
+        representation (tuple[int, ...]): The bitboard representation of the game state.
         player (int): Which player's turn it currently is at this state.
+        zobrist (int): Zobrist hash of this state.
         is_terminal (bool): Whether this state is a terminal state or not.
+        PIECES (tuple[Piece, ...]): One piece of every type and player, ordered by bitboard index.
     
     Methods:
         get_next_states: Get all possible next states.
         calculate_value: Calculate value of this game state (how good the state is relative to whose turn it is).
+        batch_value: Calculate the values of many game states at once.
         is_terminal_state: Determine whether this is a terminal state or not.
         is_in_check: Determine whether `player` is in check.
+        square_attacked: Determine whether a square is attacked by a player.
         is_in_checkmate: Determine whether `player` is in checkmate.
         is_in_stalemate: Determine whether the game is in stalemate.
     '''
 
-    default_board: list[list[Piece | None]] = [
-        [Rook(2), Knight(2), Bishop(2), King(2), Queen(2), Bishop(2), Knight(2), Rook(2)],
-        [Pawn(2) for _ in range(8)],
+    # __weakref__ lets states live in TRANSPOSITION_TABLE.
+    __slots__ = ('zobrist', '_next_boards', '_next_keys', '_check_cache', '__weakref__')
+
+    PIECES: tuple[Piece, ...] = tuple(get_piece(piece_type, player) for player in (1, 2) for piece_type in PIECE_TYPES)
+    # Material value of every bitboard, from player 1's point of view.
+    PIECE_VALUES: np.ndarray = np.array([piece.VALUE if piece.player == 1 else -piece.VALUE for piece in PIECES], dtype=np.float64)
+    # Maps mailbox bytes to the symbol of the piece on the square.
+    SYMBOLS: bytes = bytes.maketrans(bytes(range(len(PIECES) + 1)), (' ' + ''.join(str(piece) for piece in PIECES)).encode())
+
+    default_board: tuple[int, ...] = board_from_grid([
+        [get_piece(piece_type, 2) for piece_type in (Rook, Knight, Bishop, King, Queen, Bishop, Knight, Rook)],
+        [get_piece(Pawn, 2) for _ in range(8)],
         [None for _ in range(8)],
         [None for _ in range(8)],
         [None for _ in range(8)],
         [None for _ in range(8)],
-        [Pawn(1) for _ in range(8)],
-        [Rook(1), Knight(1), Bishop(1), King(1), Queen(1), Bishop(1), Knight(1), Rook(1)]
-    ]
+        [get_piece(Pawn, 1) for _ in range(8)],
+        [get_piece(piece_type, 1) for piece_type in (Rook, Knight, Bishop, King, Queen, Bishop, Knight, Rook)]
+    ])
 
-    def __init__(self, representation: list[list[Piece | None]]=default_board, player: int=1) -> None:
+    def __init__(self, representation: tuple[int, ...] | None=None, player: int=1, zobrist: int | None=None) -> None:
         '''
         Create a Chess state.
 
         Parameters:
-            representation (list[list[Piece | None]]): A 2D array representing the board.
+            representation (tuple[int, ...] | None): Twelve piece bitboards followed by the mask of unmoved king/rook squares;
+                default is None (the starting position).
             player (int): Whose turn it is at this state.
+            zobrist (int | None): Zobrist hash of the state if already known; default is None (compute it).
         '''
 
-        super().__init__(representation, player)
+        if representation is None:
+            # Boards are immutable tuples, so every game can share the same starting board.
+            representation = self.default_board
+        if zobrist is None:
+            zobrist = zobrist_hash(representation, player)
+        self.zobrist: int = zobrist
+
+        # Set before State.__init__, which already needs legal moves to determine whether the state is terminal.
+        self._next_boards: list[tuple[int, ...]] | None = None
+        self._next_keys: list[int] = []
+        self._check_cache: dict[tuple[tuple[int, ...], int], bool] = {}
+
+        super().__init__(representation, player, 2)
     
-    def get_next_states(self) -> set[State]:
+    def get_next_states(self) -> list[State]:
         '''
         Get states from taking all possible available actions.
 
         Returns:
-            set[State]: All possible states.
+            list[State]: All possible states.
         '''
 
-        return set([Chess(board, 3 - self.player) for board in self.get_next_boards()])
+        states: list[State] = []
+        for board, key in zip(self.get_next_boards(), self._next_keys):
+            state: Chess | None = TRANSPOSITION_TABLE.get(key)
+            if state is None or state.player == self.player or state.representation != board:
+                state = Chess(board, 3 - self.player, key)
+                TRANSPOSITION_TABLE[key] = state
+            states.append(state)
+
+        return states
     
-    def get_next_boards(self) -> list[list[list[Piece | None]]]:
-        boards: list[list[list[Piece | None]]] = []
-        for row in range(len(self.representation)):
-            for col in range(len(self.representation[row])):
-                piece: Piece | None = self.representation[row][col]
-                if piece is not None and piece.player == self.player:
-                    potential_boards: list[list[list[Piece | None]]] = piece.get_potential_boards(self.representation, (row, col))
-
-                    for board in potential_boards:
-                        if not self.is_in_check(board, self.player):
-                            boards.append(board)
-
-        return boards
+    def get_next_boards(self) -> list[tuple[int, ...]]:
+        '''
+        Get the boards reachable by a legal move of the player to move. Computed once per state.
+
+        Returns:
+            list[tuple[int, ...]]: All legal next boards.
+        '''
+
+        if self._next_boards is None:
+            self._next_boards, self._next_keys = self._compute_next_boards()
+        return self._next_boards
+
+    def _compute_next_boards(self) -> tuple[list[tuple[int, ...]], list[int]]:
+        # Try each move on one scratch board (make/unmake) and only copy it for the moves which are legal.
+        # Child Zobrist hashes are updated incrementally from this state's hash.
+        boards: list[tuple[int, ...]] = []
+        keys: list[int] = []
+        scratch: list[int] = list(self.representation)
+        start: int = 6 * (self.player - 1)
+        for piece in self.PIECES[start:start + 6]:
+            for square in iterate_squares(self.representation[piece.index]):
+                for new_square in iterate_squares(piece.get_targets(self.representation, square)):
+                    undo_info: tuple[int, int] = piece.apply_move(scratch, square, new_square)
+                    if not self._king_attacked(scratch, self.player):
+                        boards.append(tuple(scratch))
+
+                        captured, unmoved = undo_info
+                        key: int = self.zobrist ^ ZOBRIST_PLAYER ^ ZOBRIST_PIECES[piece.index][square] ^ ZOBRIST_PIECES[piece.index][new_square]
+                        if captured != -1:
+                            key ^= ZOBRIST_PIECES[captured][new_square]
+                        for changed in iterate_squares(unmoved ^ scratch[UNMOVED]):
+                            key ^= ZOBRIST_UNMOVED[changed]
+                        keys.append(key)
+                    piece.undo_move(scratch, square, new_square, undo_info)
+
+                # Castles are validated (including check) by King.get_special_boards itself.
+                for board in piece.get_special_boards(self.representation, square):
+                    boards.append(board)
+                    keys.append(zobrist_hash(board, 3 - self.player))
+
+        return boards, keys
     
     def calculate_value(self, player: int) -> float:
         '''
@@ -84,24 +191,39 @@ class Chess(State):
         if self.is_in_stalemate(self.representation, player):
             return 0.0
         
-        piece_vals: dict[Type[Piece], float] = {
-            Pawn: 1.0,
-            Knight: 3.0,
-            Bishop: 3.0,
-            Rook: 5.0,
-            Queen: 8.0
-        }
-
         value: float = 0.0
-        for row in self.representation:
-            for piece in row:
-                if piece is not None and not isinstance(piece, King):
-                    if piece.player == player:
-                        value += piece_vals[type(piece)]
-                    else:
-                        value -= piece_vals[type(piece)]
+        for piece in self.PIECES:
+            piece_value: float = piece.VALUE * self.representation[piece.index].bit_count()
+            if piece.player == player:
+                value += piece_value
+            else:
+                value -= piece_value
 
         return value / 38.0
+
+    @classmethod
+    def batch_value(cls, states: Sequence[State], player: int) -> np.ndarray:
+        '''
+        Calculate the values of many game states at once. Material is counted for every board with one
+        vectorized popcount and matrix product; only terminal states are evaluated one by one.
+
+        Parameters:
+            states (Sequence[State]): The Chess states to evaluate.
+            player (int): Whose turn it is in the actual game.
+
+        Returns:
+            np.ndarray: The value of each state, in order (always between -1 and 1).
+        '''
+
+        boards: np.ndarray = np.array([state.representation[:UNMOVED] for state in states], dtype=np.uint64).reshape(len(states), UNMOVED)
+        weights: np.ndarray = cls.PIECE_VALUES if player == 1 else -cls.PIECE_VALUES
+        values: np.ndarray = popcount(boards) @ weights / 38.0
+
+        for index, state in enumerate(states):
+            if state.is_terminal:
+                values[index] = state.calculate_value(player)
+
+        return values
     
     def is_terminal_state(self) -> bool:
         '''
@@ -113,90 +235,97 @@ class Chess(State):
 
         return self.is_in_stalemate(self.representation, 1) or self.is_in_stalemate(self.representation, 2) or self.is_in_checkmate(self.representation, 1) or self.is_in_checkmate(self.representation,2)
     
-    def is_in_check(self, board: list[list[Piece | None]], player: int) -> bool:
+    def is_in_check(self, board: tuple[int, ...], player: int) -> bool:
         '''
         Determine whether `player` in the game state represented by `board` is in check.
 
         Parameters:
-            board (list[list[Piece | None]]): Representation of Chess state.
+            board (tuple[int, ...]): Representation of Chess state.
             player (int): The player in question.
         
         Returns:
             bool: Whether `player` is in check or not.
         '''
 
-        for row in range(len(board)):
-            for col in range(len(board[row])):
-                piece: Piece | None = board[row][col]
+        key: tuple[tuple[int, ...], int] = (board, player)
+        if key not in self._check_cache:
+            self._check_cache[key] = self._king_attacked(board, player)
+
+        return self._check_cache[key]
+
+    def _king_attacked(self, board: tuple[int, ...] | list[int], player: int) -> bool:
+        king: int = board[King.TYPE + 6 * (player - 1)]
+        return king != 0 and is_attacked(board, king.bit_length() - 1, 3 - player)
 
-                if piece is not None and piece.player != player:
-                    for new_board in piece.get_potential_boards(board, (row, col)):
-                        new_pieces: set[Piece] = set()
-                        for new_row in new_board:
-                            new_pieces = new_pieces.union(set([new_piece for new_piece in new_row if new_piece is not None]))
-                        
-                        king: King | None = next((piece for piece in new_pieces if isinstance(piece, King) and piece.player == player), None)
-                        if king is None:
-                            return True
+    def square_attacked(self, board: tuple[int, ...] | list[int], square: int, by_player: int) -> bool:
+        '''
+        Determine whether `square` is attacked by any of `by_player`'s pieces, by looking outward from the square.
+
+        Parameters:
+            board (tuple[int, ...] | list[int]): Representation of Chess state.
+            square (int): The square in question.
+            by_player (int): The attacking player.
         
-        return False
+        Returns:
+            bool: Whether `square` is attacked or not.
+        '''
+
+        return is_attacked(board, square, by_player)
     
-    def is_in_checkmate(self, board: list[list[Piece | None]], player: int) -> bool:
+    def is_in_checkmate(self, board: tuple[int, ...], player: int) -> bool:
         '''
         Determine whether `player` in the game state represented by `board` is in checkmate.
 
         Parameters:
-            board (list[list[Piece | None]]): Representation of Chess state.
+            board (tuple[int, ...]): Representation of Chess state.
             player (int): The player in question.
         
         Returns:
             bool: Whether `player` is in checkmate or not.
         '''
 
-        if not self.is_in_check(board, player):
+        # Only the player to move can be mated, and get_next_boards already excludes moves that leave them in check.
+        if self.player != player:
             return False
-
-        boards: list[list[list[Piece | None]]] = self.get_next_boards()
-        for new_board in boards:
-            if not self.is_in_check(new_board, player):
-                return False
-
-        return True
+        return self.is_in_check(board, player) and len(self.get_next_boards()) == 0
     
-    def is_in_stalemate(self, board: list[list[Piece | None]], player: int) -> bool:
+    def is_in_stalemate(self, board: tuple[int, ...], player: int) -> bool:
         '''
         Determine whether `player` in the game state represented by `board` is in stalemate.
 
         Parameters:
-            board (list[list[Piece | None]]): Representation of Chess state.
+            board (tuple[int, ...]): Representation of Chess state.
             player (int): The player in question.
         
         Returns:
             bool: Whether `player` is in stalemate or not.
         '''
 
-        boards: list[list[list[Piece | None]]] = self.get_next_boards()
-        for new_board in boards:
-            if not self.is_in_check(new_board, player):
-                return False
-
-        return True
+        if self.player != player:
+            return False
+        return not self.is_in_check(board, player) and len(self.get_next_boards()) == 0
     
-    def __str__(self) -> str:
-        output: str = ''
-        for row in range(len(self.representation)):
-            for col in range(len(self.representation[row])):
-                piece: Piece | None = self.representation[row][col]
-                symbol: str = ' '
+    def __hash__(self) -> int:
+        '''
+        Generate a hash for the state; its Zobrist hash.
+
+        Returns:
+            int: A hash value for the state.
+        '''
 
-                if piece is not None:
-                    symbol = str(piece)
+        return self.zobrist
 
-                output += ' ' + symbol + ' '
-                if col < len(self.representation[row]) - 1:
+    def __str__(self) -> str:
+        symbols: str = to_mailbox(self.representation).translate(self.SYMBOLS).decode()
+
+        output: str = ''
+        for row in range(8):
+            for col in range(8):
+                output += ' ' + symbols[row * 8 + col] + ' '
+                if col < 7:
                     output += '|'
             
-            if row < len(self.representation) - 1:
+            if row < 7:
                 output += '\n-------------------------------\n'
 
         return output
\ No newline at end of file
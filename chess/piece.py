@@ -1,21 +1,34 @@
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import Type, Any
+from chess.bitboard import UNMOVED, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, get_occupancy, is_attacked, iterate_squares,\
+    rook_attacks
 
 class Piece(ABC):
     '''
-    A Chess Piece.
+    A Chess Piece. Pieces are immutable, so one instance per type and player can be shared by every board (see get_piece).
 
     Attributes:
         player (int): Which player this piece belongs to.
-        has_moved (bool): Whether or not this piece has moved yet.
+        index (int): Index of this piece's bitboard within a board.
+        TYPE (int): Type of the piece (Pawn=0, Knight=1, Bishop=2, Rook=3, Queen=4, King=5).
+        VALUE (float): Material value of the piece.
 
     Methods:
-        get_potential_boards: Return set of all possible boards from moving this piece.
-        get_directional_moves: Get all possible boards given directions and number of spaces.
+        get_attacks: Get the squares this piece attacks.
+        get_targets: Get the squares this piece can move to.
+        get_potential_boards: Return list of all possible boards from moving this piece.
+        get_special_boards: Return list of boards from moves that also move another piece (castling).
         get_board_from_move: Get the board that results from a specific move.
-        is_out_of_bounds: Determine whether the piece is out of bounds given position.
+        apply_move: Make a move in place, returning what is needed to undo it.
+        undo_move: Undo a move made by apply_move.
     '''
 
+    __slots__ = ('player', 'index')
+
+    TYPE: int
+    VALUE: float
+
     def __init__(self, player: int) -> None:
         '''
         Create a piece.
@@ -24,110 +37,151 @@ class Piece(ABC):
             player (int): Which player this piece belongs to.
         '''
 
-        self.player: int = player
-        self.has_moved: bool = False
-    
+        self.player: int
+        self.index: int
+        object.__setattr__(self, 'player', player)
+        object.__setattr__(self, 'index', self.TYPE + 6 * (player - 1))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __reduce__(self) -> tuple[Any, tuple[Type['Piece'], int]]:
+        return get_piece, (type(self), self.player)
+
     @abstractmethod
-    def get_potential_boards(self, board: list[list['Piece | None']], position: tuple[int, int]) -> list[list[list['Piece | None']]]:
+    def get_attacks(self, square: int, occupied: int) -> int:
         '''
-        Get all possible board states from moving this piece (not taking into account validity).
+        Get the squares attacked by this piece.
 
         Parameters:
-            board (list[list[Piece | None]]): Current board state.
-            position (tuple[int, int]): Current position of this piece.
-        
+            square (int): Current square of this piece.
+            occupied (int): Bitboard of every occupied square.
+
         Returns:
-            list[list[list[Piece | None]]]: Set of all possible board states from moving this piece.
+            int: Bitboard of attacked squares (regardless of who occupies them).
         '''
 
         pass
 
-    def get_directional_moves(self, board: list[list['Piece | None']], position: tuple[int, int], directions: set[tuple[int, int]], spaces: int) -> list[list[list['Piece | None']]]:
+    def get_targets(self, board: tuple[int, ...] | list[int], square: int) -> int:
+        '''
+        Get the squares this piece can move to (not taking into account validity).
+
+        Parameters:
+            board (tuple[int, ...] | list[int]): Current board state.
+            square (int): Current square of this piece.
+
+        Returns:
+            int: Bitboard of target squares.
+        '''
+
+        own: int = get_occupancy(board, self.player)
+        occupied: int = own | get_occupancy(board, 3 - self.player)
+        return self.get_attacks(square, occupied) & ~own
+
+    def get_potential_boards(self, board: tuple[int, ...], square: int) -> list[tuple[int, ...]]:
         '''
-        Get all possible board states from moving this piece `spaces` number of spaces in the given `directions`.
+        Get all possible board states from moving this piece (not taking into account validity).
 
         Parameters:
-            board (list[list[Piece | None]]): Current board state.
-            position (tuple[int, int]): Current position of this piece.
-            directions (set[tuple[int, int]]): Which directions to move piece.
-            spaces (int): How many squares in each direction to move.
-        
+            board (tuple[int, ...]): Current board state.
+            square (int): Current square of this piece.
+
         Returns:
-            list[list[list[Piece | None]]]: Set of all possible board states from moving this piece in the given `directions`.
-        '''
-
-        moves: list[list[list[Piece | None]]] = []
-        row: int = position[0]
-        col: int = position[1]
-
-        for dir in directions:
-            end: bool = False
-            for space in range(1, spaces + 1):
-                if end:
-                    break
-                new_row: int = row + dir[0] * space
-                new_col: int = col + dir[1] * space
-            
-                if self.is_out_of_bounds(new_row, new_col):
-                    break
-                piece: Piece | None = board[new_row][new_col]
-                if not self.is_out_of_bounds(new_row, new_col):
-                    if piece is None:
-                        moves.append(self.get_board_from_move(board, position, (new_row, new_col)))
-                    elif piece.player != self.player:
-                        moves.append(self.get_board_from_move(board, position, (new_row, new_col)))
-                        end = True
-                    elif piece.player == self.player:
-                        end = True
+            list[tuple[int, ...]]: All possible board states from moving this piece.
+        '''
+
+        moves: list[tuple[int, ...]] = [self.get_board_from_move(board, square, new_square) for new_square in iterate_squares(self.get_targets(board, square))]
+        moves.extend(self.get_special_boards(board, square))
 
         return moves
-    
-    def get_board_from_move(self, board: list[list['Piece | None']], old_pos: tuple[int, int], new_pos: tuple[int, int]) -> list[list['Piece | None']]:
+
+    def get_special_boards(self, board: tuple[int, ...], square: int) -> list[tuple[int, ...]]:
+        '''
+        Get the board states from moves which also move another piece (not taking into account validity).
+
+        Parameters:
+            board (tuple[int, ...]): Current board state.
+            square (int): Current square of this piece.
+
+        Returns:
+            list[tuple[int, ...]]: Board states from special moves; none by default.
+        '''
+
+        return []
+
+    def get_board_from_move(self, board: tuple[int, ...], old_square: int, new_square: int) -> tuple[int, ...]:
         '''
         Make a certain move with this piece.
 
         Parameters:
-            board (list[list[Piece | None]]): Current state of the board.
-            old_pos (tuple[int, int]): Current position of piece.
-            new_pos (tuple[int, int]): New position of piece.
-        
+            board (tuple[int, ...]): Current state of the board.
+            old_square (int): Current square of piece.
+            new_square (int): New square of piece.
+
         Returns:
-            list[list[Piece | None]]: Board after move is completed.
+            tuple[int, ...]: Board after move is completed.
         '''
 
-        new_board: list[list[Piece | None]] = [row[:] for row in board]
-        piece: Piece | None = board[old_pos[0]][old_pos[1]]
+        new_board: list[int] = list(board)
+        self.apply_move(new_board, old_square, new_square)
 
-        if piece is not None:
-            piece.has_moved = True
-        new_board[old_pos[0]][old_pos[1]] = None
-        new_board[new_pos[0]][new_pos[1]] = piece
+        return tuple(new_board)
 
-        return new_board
-    
-    
-    def is_out_of_bounds(self, row: int, col: int) -> bool:
+    def apply_move(self, board: list[int], old_square: int, new_square: int) -> tuple[int, int]:
         '''
-        Determine whether a given position is out of bounds.
+        Make a certain move with this piece, modifying `board` in place.
 
         Parameters:
-            row (int): Row position of piece.
-            col (int): Column position of piece.
-        
+            board (list[int]): State of the board to modify.
+            old_square (int): Current square of piece.
+            new_square (int): New square of piece.
+
         Returns:
-            bool: Whether this piece is out of bounds or not given its position.
+            tuple[int, int]: Undo information; the index of the captured bitboard (-1 if none) and the previous unmoved mask.
+        '''
+
+        old_bit: int = 1 << old_square
+        new_bit: int = 1 << new_square
+        captured: int = -1
+        unmoved: int = board[UNMOVED]
+
+        board[self.index] ^= old_bit | new_bit
+        start: int = 6 * (2 - self.player)
+        for index in range(start, start + 6):
+            if board[index] & new_bit:
+                board[index] ^= new_bit
+                captured = index
+                break
+        board[UNMOVED] = unmoved & ~(old_bit | new_bit)
+
+        return captured, unmoved
+
+    def undo_move(self, board: list[int], old_square: int, new_square: int, undo_info: tuple[int, int]) -> None:
+        '''
+        Undo a move made by apply_move, modifying `board` in place.
+
+        Parameters:
+            board (list[int]): State of the board to restore.
+            old_square (int): Square the piece moved from.
+            new_square (int): Square the piece moved to.
+            undo_info (tuple[int, int]): The value returned by apply_move.
         '''
-        
-        return not (0 <= row <= 7 and 0 <= col <= 7)
-    
+
+        captured, unmoved = undo_info
+        board[self.index] ^= (1 << old_square) | (1 << new_square)
+        if captured != -1:
+            board[captured] ^= 1 << new_square
+        board[UNMOVED] = unmoved
+
     def __eq__(self, other: Any) -> bool:
         if not isinstance(other, Piece):
             return False
-        return type(self) == type(other) and self.player == other.player# and self.has_moved == other.has_moved
-    
+        return type(self) == type(other) and self.player == other.player
+
     def __hash__(self) -> int:
-        return hash((type(self), self.player, self.has_moved))
-    
+        return hash((type(self), self.player))
+
     def __str__(self) -> str:
         symbols: dict[Type[Piece], str] = {
             Pawn: 'p',
@@ -137,118 +191,170 @@ class Piece(ABC):
             Queen: 'q',
             King: 'k'
         }
-        
+
         letter: str = symbols.get(type(self), '?')
         if self.player == 1:
             return letter.upper()
         return letter
 
 class Knight(Piece):
+    __slots__ = ()
+
+    TYPE: int = 1
+    VALUE: float = 3.0
+
     def __init__(self, player: int) -> None:
         super().__init__(player)
 
-    def get_potential_boards(self, board: list[list[Piece | None]], position: tuple[int, int]) -> list[list[list[Piece | None]]]:
-        return self.get_directional_moves(board, position, set([(2, 1), (2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2), (-2, 1), (-2, -1)]), 1)
+    def get_attacks(self, square: int, occupied: int) -> int:
+        return KNIGHT_ATTACKS[square]
 
 class Rook(Piece):
+    __slots__ = ()
+
+    TYPE: int = 3
+    VALUE: float = 5.0
+
     def __init__(self, player: int) -> None:
         super().__init__(player)
-    
-    def get_potential_boards(self, board: list[list[Piece | None]], position: tuple[int, int]) -> list[list[list[Piece | None]]]:
-        return self.get_directional_moves(board, position, set([(0, 1), (0, -1), (-1, 0), (1, 0)]), 8)
+
+    def get_attacks(self, square: int, occupied: int) -> int:
+        return rook_attacks(square, occupied)
 
 class Bishop(Piece):
+    __slots__ = ()
+
+    TYPE: int = 2
+    VALUE: float = 3.0
+
     def __init__(self, player: int) -> None:
         super().__init__(player)
-    
-    def get_potential_boards(self, board: list[list[Piece | None]], position: tuple[int, int]) -> list[list[list[Piece | None]]]:
-        return self.get_directional_moves(board, position, set([(1, 1), (1, -1), (-1, 1), (-1, -1)]), 8)
+
+    def get_attacks(self, square: int, occupied: int) -> int:
+        return bishop_attacks(square, occupied)
 
 class Queen(Piece):
+    __slots__ = ()
+
+    TYPE: int = 4
+    VALUE: float = 8.0
+
     def __init__(self, player: int) -> None:
         super().__init__(player)
-    
-    def get_potential_boards(self, board: list[list[Piece | None]], position: tuple[int, int]) -> list[list[list[Piece | None]]]:
-        return self.get_directional_moves(board, position, set([(0, 1), (0, -1), (-1, 0), (1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]), 8)
+
+    def get_attacks(self, square: int, occupied: int) -> int:
+        return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+
+def _build_castles(first_row: int) -> tuple[tuple[int, int, int, int, tuple[int, ...]], ...]:
+    # The king starts on column 3, so castling with the column 0 rook moves the king to 1 and the rook to 2, and castling
+    # with the column 7 rook moves the king to 5 and the rook to 4. Every square between king and rook must be empty.
+    # (rook column, new king column, new rook column, columns which must be empty, columns the king passes or lands on)
+    king_bit: int = 1 << (first_row * 8 + 3)
+    return tuple(
+        (1 << (first_row * 8 + rook_col),
+         king_bit | 1 << (first_row * 8 + king_col),
+         1 << (first_row * 8 + rook_col) | 1 << (first_row * 8 + new_rook_col),
+         sum(1 << (first_row * 8 + col) for col in path_cols),
+         tuple(first_row * 8 + col for col in king_cols))
+        for rook_col, king_col, new_rook_col, path_cols, king_cols in ((0, 1, 2, (1, 2), (2, 1)), (7, 5, 4, (4, 5, 6), (4, 5)))
+    )
 
 class King(Piece):
+    __slots__ = ()
+
+    TYPE: int = 5
+    VALUE: float = 0.0
+
+    # Per player: the king's starting square, and (rook square, king move, rook move, path) masks plus the squares
+    # the king crosses for each castle.
+    HOME_SQUARES: tuple[int, ...] = (7 * 8 + 3, 3)
+    CASTLES: tuple[tuple[tuple[int, int, int, int, tuple[int, ...]], ...], ...] = (_build_castles(7), _build_castles(0))
+
     def __init__(self, player: int) -> None:
         super().__init__(player)
-    
-    def get_potential_boards(self, board: list[list[Piece | None]], position: tuple[int, int]) -> list[list[list[Piece | None]]]:
-        moves: list[list[list[Piece | None]]] = self.get_directional_moves(board, position, set([(0, 1), (0, -1), (-1, 0), (1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]), 1)
-        king: Piece | None = board[position[0]][position[1]]
-
-        if king is not None and not self.has_moved:
-            first_row: int
-            if self.player == 1:
-                first_row = 7
-            else:
-                first_row = 0
-            
-            left_pos: tuple[int, int] = (first_row, 0)
-            right_pos: tuple[int, int] = (first_row, 7)
-
-            left_piece: Piece | None = board[left_pos[0]][left_pos[1]]
-            right_piece: Piece | None = board[right_pos[0]][right_pos[1]]
-
-            if left_piece is not None and not left_piece.has_moved:
-                new_board: list[list[Piece | None]] = [row[:] for row in board]
-                new_board[left_pos[0]][left_pos[1]] = None
-                new_board[right_pos[0]][right_pos[1]] = None
-
-                new_board[first_row][1] = king
-                new_board[first_row][2] = left_piece
-                king.has_moved = True
-                left_piece.has_moved = True
-                moves.append(new_board)
-            
-            if right_piece is not None and not right_piece.has_moved:
-                new_board = [row[:] for row in board]
-                new_board[left_pos[0]][left_pos[1]] = None
-                new_board[right_pos[0]][right_pos[1]] = None
-
-                new_board[first_row][6] = king
-                new_board[first_row][5] = right_piece
-                king.has_moved = True
-                right_piece.has_moved = True
-                moves.append(new_board)
-        
+
+    def get_attacks(self, square: int, occupied: int) -> int:
+        return KING_ATTACKS[square]
+
+    def get_special_boards(self, board: tuple[int, ...], square: int) -> list[tuple[int, ...]]:
+        '''
+        Get the board states from castling. Unlike other moves these are fully legal: the king may not castle
+        out of, through or into check.
+
+        Parameters:
+            board (tuple[int, ...]): Current board state.
+            square (int): Current square of the king.
+
+        Returns:
+            list[tuple[int, ...]]: Board states from every legal castle.
+        '''
+
+        moves: list[tuple[int, ...]] = []
+
+        king_bit: int = 1 << square
+        enemy: int = 3 - self.player
+        if square != self.HOME_SQUARES[self.player - 1] or not board[UNMOVED] & king_bit or is_attacked(board, square, enemy):
+            return moves
+
+        occupied: int = get_occupancy(board, 1) | get_occupancy(board, 2)
+        rook_index: int = Rook.TYPE + 6 * (self.player - 1)
+
+        for rook_bit, king_move, rook_move, path, king_squares in self.CASTLES[self.player - 1]:
+            if board[UNMOVED] & rook_bit and board[rook_index] & rook_bit and not occupied & path\
+            and not any(is_attacked(board, king_square, enemy) for king_square in king_squares):
+                new_board: list[int] = list(board)
+                new_board[self.index] ^= king_move
+                new_board[rook_index] ^= rook_move
+                new_board[UNMOVED] &= ~(king_bit | rook_bit)
+                moves.append(tuple(new_board))
+
         return moves
 
 class Pawn(Piece):
+    __slots__ = ()
+
+    TYPE: int = 0
+    VALUE: float = 1.0
+
+    # Per player: the square offset of one step forward, and the row pawns start on.
+    FORWARD: tuple[int, ...] = (-8, 8)
+    START_ROWS: tuple[int, ...] = (6, 1)
+
     def __init__(self, player: int) -> None:
         super().__init__(player)
-    def get_potential_boards(self, board: list[list[Piece | None]], position: tuple[int, int]) -> list[list[list[Piece | None]]]:
-        moves: list[list[list[Piece | None]]] = []
-        forward: int
-        start_row: int
-        promote_row: int
 
-        if self.player == 1:
-            forward = -1
-            start_row = 6
-            promote_row = 0
-        else:
-            forward = 1
-            start_row = 1
-            promote_row = 7
-        
-        new_pos: tuple[int, int] = (position[0] + forward, position[1])
-        if not self.is_out_of_bounds(new_pos[0], new_pos[1]) and board[new_pos[0]][new_pos[1]] is None:
-            moves.append(self.get_board_from_move(board, position, new_pos))
-        
-        if position[0] == start_row:
-            new_pos = (position[0] + forward * 2, position[1])
-            if not self.is_out_of_bounds(new_pos[0], new_pos[1]):
-                if board[new_pos[0]][new_pos[1]] is None:
-                    moves.append(self.get_board_from_move(board, position, new_pos))
-        
-        for col_change in [-1, 1]:
-            new_pos = (position[0] + forward, position[1] + col_change)
-            if not self.is_out_of_bounds(new_pos[0], new_pos[1]):
-                piece: Piece | None = board[new_pos[0]][new_pos[1]]
-                if piece is not None and piece.player != self.player:
-                    moves.append(self.get_board_from_move(board, position, new_pos))
-        
-        return moves
\ No newline at end of file
+    def get_attacks(self, square: int, occupied: int) -> int:
+        return PAWN_ATTACKS[self.player - 1][square]
+
+    def get_targets(self, board: tuple[int, ...] | list[int], square: int) -> int:
+        forward: int = self.FORWARD[self.player - 1]
+
+        enemy: int = get_occupancy(board, 3 - self.player)
+        occupied: int = enemy | get_occupancy(board, self.player)
+        targets: int = self.get_attacks(square, occupied) & enemy
+
+        new_square: int = square + forward
+        if 0 <= new_square <= 63 and not occupied & (1 << new_square):
+            targets |= 1 << new_square
+
+            if square // 8 == self.START_ROWS[self.player - 1] and not occupied & (1 << (new_square + forward)):
+                targets |= 1 << (new_square + forward)
+
+        return targets
+
+PIECE_TYPES: tuple[Type[Piece], ...] = (Pawn, Knight, Bishop, Rook, Queen, King)
+
+@lru_cache(maxsize=len(PIECE_TYPES) * 2)
+def get_piece(piece_type: Type[Piece], player: int) -> Piece:
+    '''
+    Get the shared instance of a piece.
+
+    Parameters:
+        piece_type (Type[Piece]): Which type of piece.
+        player (int): Which player the piece belongs to.
+
+    Returns:
+        Piece: The piece.
+    '''
+
+    return piece_type(player)
\ No newline at end of file
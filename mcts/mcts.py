@@ -1,126 +1,257 @@
-from mcts.node import Node
-from state import State
-import numpy as np
+from mcts.state import State
+from mcts.tree import EPSILON, Tree, backprop, ucb1_select
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import count
+from multiprocessing import Pool
+from threading import Event, Lock
+import math
 import random
 
+EXPLORE_CONST: float = math.sqrt(2.0)
+
 class MCTS:
     '''
     Monte Carlo Tree Search algorithm.
 
     Attributes:
         player (int): Which player the algorithm is calculating for.
-        root (Node): The root node of the tree.
+        tree (Tree): The search tree.
+        root (int): Index of the root node of the tree.
+        num_rollouts (int): How many random simulations to run (in parallel when above 1) from each expanded node.
     
     Methods:
         get_best_action: Run the actual MCTS algorithm by getting the best possible action.
+        get_best_action_collect: Run the MCTS algorithm and collect the statistics of the root's children.
+        get_best_action_parallel: Run independent MCTS searches in worker processes and combine their results.
+        search: Run iterations of the MCTS algorithm from the root.
+        search_parallel: Run iterations of the MCTS algorithm from the root in several threads sharing the tree.
         selection: Selects a leaf node based on UCB1.
         expansion: Expands the leaf node into all possible next states.
         simulation: Simulates a game until a terminal state (or other cutoff) is reached.
         backpropagation: Backpropagates the simulation results up the tree to the root node.
         update_root: Update root of the tree based on the new game state.
     '''
-    def __init__(self, player: int, initial_state: State) -> None:
+    def __init__(self, player: int, initial_state: State, num_rollouts: int=1) -> None:
         '''
         Create a MCTS object.
 
         Parameters:
             player (int): Which player the algorithm is calculating for.
             initial_state (State): Initial state of the game.
+            num_rollouts (int): How many random simulations to run from each expanded node; default is 1.
         '''
 
         self.player: int = player
-        self.root: Node = Node(state=initial_state)
+        self.num_rollouts: int = num_rollouts
+        self.tree: Tree = Tree()
+        self.root: int = self.tree.add_node(initial_state)
     
-    def get_best_action(self, max_iter: int=10000) -> State:
+    def get_best_action(self, max_iter: int=10000, n_threads: int=1) -> State:
         '''
         Run the Monte Carlo Tree Search algorithm.
 
         Parameters:
-            player(int): Which player's turn it currently is.
+            max_iter (int): How many iterations of the algorithm to run.
+            n_threads (int): How many threads search the tree at once; default is 1. Only allowed with `num_rollouts`
+                above 1 (see search_parallel).
 
         Returns:
             State: The best next possible state for the player.
         '''
         
+        if n_threads > 1:
+            self.search_parallel(max_iter, n_threads)
+        else:
+            self.search(max_iter)
+
+        best_node: int = max(self.tree.get_children(self.root), key=self.tree.get_value)
+        best_state: State = self.tree.states[best_node]
+
+        self.update_root(best_state)
+        return best_state
+
+    def get_best_action_collect(self, max_iter: int=10000) -> dict[State, tuple[float, int]]:
+        '''
+        Run the Monte Carlo Tree Search algorithm without committing to an action.
+
+        Parameters:
+            max_iter (int): How many iterations of the algorithm to run.
+
+        Returns:
+            dict[State, tuple[float, int]]: The total score and number of simulations of every child of the root.
+        '''
+
+        self.search(max_iter)
+
+        return {self.tree.states[child]: (float(self.tree.total_score[child]), int(self.tree.num_sims[child]))
+                for child in self.tree.get_children(self.root)}
+
+    def get_best_action_parallel(self, n_workers: int, max_iter: int=10000) -> State:
+        '''
+        Run `n_workers` independent searches from the current root in separate processes (root parallelization)
+        and pick the action with the best combined value. Worker processes cannot start rollout processes of their own,
+        so every worker runs a single rollout per iteration whatever `num_rollouts` is.
+
+        Parameters:
+            n_workers (int): How many worker processes to run.
+            max_iter (int): How many iterations each worker runs.
+
+        Returns:
+            State: The best next possible state for the player.
+        '''
+
+        root_state: State = self.tree.states[self.root]
+        seeds: list[int] = [random.getrandbits(32) for _ in range(n_workers)]
+        with Pool(n_workers) as pool:
+            results: list[dict[State, tuple[float, int]]] = pool.map(_collect_worker, [(self.player, root_state, max_iter, seed) for seed in seeds])
+
+        totals: dict[State, tuple[float, int]] = {}
+        for result in results:
+            for state, (total_score, num_sims) in result.items():
+                prev_score, prev_sims = totals.get(state, (0.0, 0))
+                totals[state] = (prev_score + total_score, prev_sims + num_sims)
+
+        best_state: State = max(totals, key=lambda state: totals[state][0] / (totals[state][1] + EPSILON))
+
+        self.update_root(best_state)
+        return best_state
+
+    def search(self, max_iter: int) -> None:
+        '''
+        Run iterations of selection, expansion, simulation and backpropagation from the root.
+
+        Parameters:
+            max_iter (int): How many iterations to run.
+        '''
+
         for _ in range(max_iter):
-            leaf_node: Node = self.selection()
+            leaf_node: int = self.selection()
 
-            node: Node | None = self.expansion(leaf_node)
+            node: int | None = self.expansion(leaf_node)
+            if node is None:
+                # Terminal leaf: score the leaf itself so the search does not keep selecting it for nothing.
+                node = leaf_node
 
-            if node is not None:
-                value = self.simulation(node)
-                self.backpropagation(node, value)
-        
-        best_node: Node = max(self.root.children, key=lambda child: child.get_value())
+            value = self.simulation(node, num_rollouts=self.num_rollouts)
+            self.backpropagation(node, value)
 
-        self.update_root(best_node.state)
-        return best_node.state
+    def search_parallel(self, max_iter: int, n_threads: int) -> None:
+        '''
+        Run iterations from the root in `n_threads` threads sharing one tree (tree parallelization).
+        Every access to the tree's arrays (selection, expansion, backpropagation) is locked; only simulation runs unlocked.
+        A thread waiting on its rollout processes releases the GIL, so with `num_rollouts` above 1 the simulations of
+        several threads run at once, and virtual losses steer the threads to different leaves. With single rollouts the
+        threads would only take turns holding the GIL, so that case is rejected.
+        An exception raised by any thread stops the search and is raised again here.
 
-    def selection(self, explore_const: float=float(np.sqrt(2))) -> Node:
+        Parameters:
+            max_iter (int): How many iterations to run in total.
+            n_threads (int): How many threads to run.
+        '''
+
+        if self.num_rollouts <= 1:
+            raise ValueError('search_parallel needs num_rollouts above 1; use search instead')
+
+        iterations = count()
+        lock: Lock = Lock()
+        failed: Event = Event()
+
+        def worker() -> None:
+            try:
+                search_loop()
+            except BaseException:
+                failed.set()
+                raise
+
+        def search_loop() -> None:
+            while not failed.is_set() and next(iterations) < max_iter:
+                # Expansion may reallocate the arrays, so selection and backpropagation must not overlap with it.
+                with lock:
+                    leaf_node: int = self.selection()
+                    node: int | None = self.expansion(leaf_node)
+                if node is None:
+                    node = leaf_node
+
+                value = self.simulation(node, num_rollouts=self.num_rollouts)
+                with lock:
+                    self.backpropagation(node, value)
+
+        try:
+            with ThreadPoolExecutor(n_threads) as executor:
+                futures: list[Future] = [executor.submit(worker) for _ in range(n_threads)]
+            for future in futures:
+                future.result()
+        finally:
+            # No search is in flight any more; make sure no virtual loss outlives it into later searches.
+            self.tree.virtual_loss[:self.tree.size] = 0
+
+    def selection(self, explore_const: float=EXPLORE_CONST) -> int:
         '''
         Select the best leaf node given UCB1 metrics.
         
         Returns:
-            Node: Leaf node to be expanded.
+            int: Index of the leaf node to be expanded.
         '''
         
-        node: Node = self.root
-        while not node.is_leaf():
-            node = max(node.children, key=lambda child: child.UCB1(explore_const))
-        
-        return node
+        tree: Tree = self.tree
+        return int(ucb1_select(self.root, tree.total_score, tree.num_sims, tree.first_child, tree.num_children, tree.virtual_loss, explore_const))
 
-    def expansion(self, node: Node) -> Node | None:
+    def expansion(self, node: int) -> int | None:
         '''
         Expand given node into all possible game states reachable within one action.
+        A node which has already been expanded keeps its children.
 
         Parameters:
-            node (Node): The leaf node to be expanded.
+            node (int): Index of the leaf node to be expanded.
         
         Returns:
-            Node: A random child of the expanded node.
+            int | None: Index of a random child of the expanded node, or None if it has no children.
         '''
 
-        node.add_children(set([Node(state, node) for state in node.state.get_next_states()]))
+        children: range = self.tree.get_children(node)
+        if len(children) == 0:
+            children = self.tree.add_children(node, self.tree.states[node].get_next_states())
 
-        if len(node.children) == 0:
+        if len(children) == 0:
             return None
-        return random.choice(list(node.children))
 
-    def simulation(self, node: Node, max_sims: int=1000) -> float:
+        child: int = random.choice(children)
+        self.tree.virtual_loss[child] += 1
+        return child
+
+    def simulation(self, node: int, max_sims: int=1000, num_rollouts: int=1) -> float:
         '''
-        Perform a random simulation of the game from the state of the node.
+        Perform random simulations of the game from the state of the node. Multiple simulations run in parallel
+        worker processes (leaf parallelization).
 
         Parameters:
-            node (Node): The node to begin the simulation.
+            node (int): Index of the node to begin the simulation.
+            max_sims (int): Maximum number of actions to take in each simulation.
+            num_rollouts (int): How many simulations to run; default is 1.
         
         Returns:
-            float: The value of the terminal state of the simulation.
+            float: The mean value of the terminal states of the simulations.
         '''
 
-        state: State = node.state
-        num_sims = 0
+        state: State = self.tree.states[node]
+        if num_rollouts <= 1:
+            return rollout(state, self.player, max_sims)
 
-        while not state.is_terminal and num_sims < max_sims:
-            state = state.take_random_action()
-            num_sims += 1
-        
-        return state.calculate_value(self.player)
+        futures = [_get_rollout_pool().submit(rollout_state, state, max_sims, random.getrandbits(32)) for _ in range(num_rollouts)]
+        final_states: list[State] = [future.result() for future in futures]
+        return float(type(state).batch_value(final_states, self.player).mean())
 
-    def backpropagation(self, node: Node, value: float) -> None:
+    def backpropagation(self, node: int, value: float) -> None:
         '''
         Propagate the simulation value back through the tree to the root.
 
         Parameters:
-            node (Node): Leaf node which the simulation ran from.
+            node (int): Index of the leaf node which the simulation ran from.
             value (float): Value of the simulation.
         '''
         
-        node.update(value)
-
-        while node.parent is not None:
-            node = node.parent
-            node.update(value)
+        tree: Tree = self.tree
+        backprop(node, value, tree.parent, tree.total_score, tree.num_sims, tree.virtual_loss)
     
     def update_root(self, state: State) -> None:
         '''
@@ -130,16 +261,81 @@ class MCTS:
             state (State): The new state of the game.
         '''
 
-        nodes: set[Node] = self.root.children
+        nodes: list[int] = list(self.tree.get_children(self.root))
         for _ in range(state.num_players):
-            prev_nodes: set[Node] = nodes.copy()
-            nodes = set()
+            prev_nodes: list[int] = nodes
+            nodes = []
 
             for node in prev_nodes:
-                if node.state == state:
+                if self.tree.states[node] == state:
                     self.root = node
+                    self.tree.parent[node] = -1
                     return
                 else:
-                    nodes = nodes.union(node.children)
+                    nodes.extend(self.tree.get_children(node))
+
+        self.root = self.tree.add_node(state)
+
+_rollout_pool: ProcessPoolExecutor | None = None
+
+def _get_rollout_pool() -> ProcessPoolExecutor:
+    global _rollout_pool
+    if _rollout_pool is None:
+        _rollout_pool = ProcessPoolExecutor()
+    return _rollout_pool
+
+def rollout(state: State, player: int, max_sims: int=1000, seed: int | None=None) -> float:
+    '''
+    Take random actions from `state` until a terminal state (or `max_sims` actions) is reached.
+
+    Parameters:
+        state (State): The state to begin the simulation.
+        player (int): Which player the value is calculated for.
+        max_sims (int): Maximum number of actions to take.
+        seed (int | None): Seed for the random number generator; default is None (leave it as is).
+
+    Returns:
+        float: The value of the final state of the simulation.
+    '''
+
+    return rollout_state(state, max_sims, seed).calculate_value(player)
+
+def rollout_state(state: State, max_sims: int=1000, seed: int | None=None) -> State:
+    '''
+    Take random actions from `state` until a terminal state (or `max_sims` actions) is reached, without evaluating it.
+    Leaf-parallel simulations collect these final states and evaluate them together with State.batch_value.
+
+    Parameters:
+        state (State): The state to begin the simulation.
+        max_sims (int): Maximum number of actions to take.
+        seed (int | None): Seed for the random number generator; default is None (leave it as is).
+
+    Returns:
+        State: The final state of the simulation.
+    '''
+
+    if seed is not None:
+        random.seed(seed)
+
+    num_sims = 0
+    while not state.is_terminal and num_sims < max_sims:
+        state = state.take_random_action()
+        num_sims += 1
+
+    return state
+
+def _collect_worker(args: tuple[int, State, int, int]) -> dict[State, tuple[float, int]]:
+    '''
+    Run one root-parallel search in a worker process.
+
+    Parameters:
+        args (tuple[int, State, int, int]): The player, root state, number of iterations and random seed.
+
+    Returns:
+        dict[State, tuple[float, int]]: The total score and number of simulations of every child of the root.
+    '''
 
-        self.root = Node(state)
+    player, state, max_iter, seed = args
+    random.seed(seed)
+    # Pool workers are daemonic and cannot start the rollout pool, so each search runs single rollouts.
+    return MCTS(player, state, num_rollouts=1).get_best_action_collect(max_iter)
\ No newline at end of file
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
+import numpy as np
 import random
-from typing import Any
+from typing import Any, Sequence
 
 class State(ABC):
     '''
@@ -16,9 +17,13 @@ class State(ABC):
         get_next_states: Get all states which are possible to reach within 1 action.
         take_random_action: Get the state from taking a random action.
         calculate_value: Calculate the value of the game state.
+        batch_value: Calculate the values of many game states at once.
         is_terminal: Determine whether this state is a terminal state.
     '''
 
+    # Subclasses should declare __slots__ too; MCTS keeps a very large number of states alive.
+    __slots__ = ('representation', 'player', 'num_players', 'is_terminal')
+
     def __init__(self, representation: Any, player: int, num_players: int) -> None:
         '''
         Create a new state.
@@ -35,12 +40,12 @@ class State(ABC):
         self.is_terminal: bool = self.is_terminal_state()
 
     @abstractmethod
-    def get_next_states(self) -> set['State']:
+    def get_next_states(self) -> list['State']:
         '''
         Get states from taking all possible available actions.
 
         Returns:
-            set[State]: All possible states.
+            list[State]: All possible states, without duplicates.
         '''
 
         pass
@@ -53,7 +58,7 @@ class State(ABC):
             State: A random state.
         '''
 
-        return random.choice(list(self.get_next_states()))
+        return random.choice(self.get_next_states())
 
     @abstractmethod
     def calculate_value(self, player: int) -> float:
@@ -69,6 +74,21 @@ class State(ABC):
 
         pass
 
+    @classmethod
+    def batch_value(cls, states: Sequence['State'], player: int) -> np.ndarray:
+        '''
+        Calculate the values of many game states at once. Games may override this with a vectorized version.
+
+        Parameters:
+            states (Sequence[State]): The states to evaluate.
+            player (int): Whose turn it is in the actual game.
+
+        Returns:
+            np.ndarray: The value of each state, in order.
+        '''
+
+        return np.array([state.calculate_value(player) for state in states], dtype=np.float64)
+
     @abstractmethod
     def is_terminal_state(self) -> bool:
         '''
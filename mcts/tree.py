@@ -0,0 +1,244 @@
+import math
+import numpy as np
+from mcts.state import State
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE: bool = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        '''
+        Stand-in for numba.njit when Numba is not installed; leaves the function as plain Python.
+        '''
+
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+# Added to visit counts so that unvisited nodes do not divide by zero.
+EPSILON: float = 1e-6
+
+class Tree:
+    '''
+    A MCTS tree stored as a struct of arrays. Node `i`'s statistics live at index `i` of every array,
+    and the children of a node are always stored contiguously.
+
+    Attributes:
+        states (list[State]): Which state each node represents.
+        total_score (np.ndarray): How many simulation wins each node has achieved.
+        num_sims (np.ndarray): How many total simulations have been run from each node.
+        parent (np.ndarray): Index of each node's parent node; -1 for a root.
+        first_child (np.ndarray): Index of each node's first child node; -1 if it has none.
+        num_children (np.ndarray): How many child nodes each node has.
+        virtual_loss (np.ndarray): How many in-flight searches currently pass through each node.
+        size (int): How many nodes are in the tree.
+
+    Methods:
+        add_node: Add a new node to the tree.
+        add_children: Add the children of a node to the tree.
+        get_children: Get the indices of a node's children.
+        get_value: Calculates value of node based on simulations.
+    '''
+
+    def __init__(self, capacity: int=1024) -> None:
+        '''
+        Create an empty tree.
+
+        Parameters:
+            capacity (int): How many nodes to allocate room for up front; default is 1024.
+        '''
+
+        self.states: list[State] = []
+        self.total_score: np.ndarray = np.zeros(capacity, dtype=np.float64) # w_i
+        self.num_sims: np.ndarray = np.zeros(capacity, dtype=np.int32) # n_i
+        self.parent: np.ndarray = np.full(capacity, -1, dtype=np.int32)
+        self.first_child: np.ndarray = np.full(capacity, -1, dtype=np.int32)
+        self.num_children: np.ndarray = np.zeros(capacity, dtype=np.int32)
+        self.virtual_loss: np.ndarray = np.zeros(capacity, dtype=np.int32)
+        self.size: int = 0
+
+    def add_node(self, state: State, parent: int=-1) -> int:
+        '''
+        Add a single node to the tree.
+
+        Parameters:
+            state (State): Which state the node represents.
+            parent (int): Index of the node's parent node; default is -1 (no parent).
+
+        Returns:
+            int: Index of the new node.
+        '''
+
+        self._reserve(1)
+        index: int = self.size
+        self.states.append(state)
+        self.total_score[index] = 0.0
+        self.num_sims[index] = 0
+        self.parent[index] = parent
+        self.first_child[index] = -1
+        self.num_children[index] = 0
+        self.virtual_loss[index] = 0
+        self.size += 1
+
+        return index
+
+    def add_children(self, node: int, states: list[State]) -> range:
+        '''
+        Add children to a node which has none yet.
+
+        Parameters:
+            node (int): Index of the parent node.
+            states (list[State]): Which states the new children represent.
+
+        Returns:
+            range: Indices of the new children.
+        '''
+
+        first: int = self.size
+        for state in states:
+            self.add_node(state, node)
+
+        if len(states) > 0:
+            self.first_child[node] = first
+            self.num_children[node] = len(states)
+
+        return range(first, self.size)
+
+    def get_children(self, node: int) -> range:
+        '''
+        Get the children of a node.
+
+        Parameters:
+            node (int): Index of the node.
+
+        Returns:
+            range: Indices of the node's children.
+        '''
+
+        first: int = int(self.first_child[node])
+        return range(first, first + int(self.num_children[node]))
+
+    def get_value(self, node: int) -> float:
+        '''
+        Calculate value of node.
+
+        Parameters:
+            node (int): Index of the node.
+
+        Returns:
+            float: Value of node given by total score / number of simulations.
+        '''
+
+        return float(self.total_score[node]) / (float(self.num_sims[node]) + EPSILON)
+
+    def _reserve(self, count: int) -> None:
+        needed: int = self.size + count
+        capacity: int = len(self.total_score)
+        if needed <= capacity:
+            return
+
+        while capacity < needed:
+            capacity *= 2
+        self.total_score = np.resize(self.total_score, capacity)
+        self.num_sims = np.resize(self.num_sims, capacity)
+        self.parent = np.resize(self.parent, capacity)
+        self.first_child = np.resize(self.first_child, capacity)
+        self.num_children = np.resize(self.num_children, capacity)
+        self.virtual_loss = np.resize(self.virtual_loss, capacity)
+
+@njit(cache=True, nogil=True)
+def _ucb1_select_loop(node: int, total_score: np.ndarray, num_sims: np.ndarray, first_child: np.ndarray, num_children: np.ndarray,
+                      virtual_loss: np.ndarray, explore_const: float) -> int:
+    '''
+    Descend from `node` to a leaf node, choosing the child with the highest UCB1 value at each step.
+    Every node on the path gets a virtual loss (a visit scoring nothing) so concurrent searches spread out.
+    A node's virtual loss is only added once its children have been scored, so a lone search scores exactly as plain UCB1.
+
+    Parameters:
+        node (int): Index of the node to start from.
+        total_score (np.ndarray): Tree.total_score.
+        num_sims (np.ndarray): Tree.num_sims.
+        first_child (np.ndarray): Tree.first_child.
+        num_children (np.ndarray): Tree.num_children.
+        virtual_loss (np.ndarray): Tree.virtual_loss.
+        explore_const (float): The exploration constant according to the UCB1 formula.
+
+    Returns:
+        int: Index of the selected leaf node.
+    '''
+
+    while num_children[node] > 0:
+        log_N_i: float = math.log(max(float(num_sims[node] + virtual_loss[node]), 1.0))
+        best: int = first_child[node]
+        best_value: float = -math.inf
+
+        for child in range(first_child[node], first_child[node] + num_children[node]):
+            n_i: float = float(num_sims[child] + virtual_loss[child]) + EPSILON
+            value: float = total_score[child] / n_i + explore_const * math.sqrt(log_N_i / n_i)
+            if value > best_value:
+                best = child
+                best_value = value
+
+        virtual_loss[node] += 1
+        node = best
+
+    virtual_loss[node] += 1
+    return node
+
+def _ucb1_select_vectorized(node: int, total_score: np.ndarray, num_sims: np.ndarray, first_child: np.ndarray, num_children: np.ndarray,
+                            virtual_loss: np.ndarray, explore_const: float) -> int:
+    '''
+    Same as _ucb1_select_loop, but scores the children of a node at once with NumPy when there are more than a few.
+    Used when Numba is not installed, where a per-child Python loop would be slow.
+    '''
+
+    while num_children[node] > 0:
+        log_N_i: float = math.log(max(float(num_sims[node] + virtual_loss[node]), 1.0))
+        first: int = int(first_child[node])
+        last: int = first + int(num_children[node])
+
+        best: int = first
+        if last - first <= 4:
+            best_value: float = -math.inf
+            for child in range(first, last):
+                n: float = float(num_sims[child] + virtual_loss[child]) + EPSILON
+                value: float = float(total_score[child]) / n + explore_const * math.sqrt(log_N_i / n)
+                if value > best_value:
+                    best = child
+                    best_value = value
+        else:
+            n_i: np.ndarray = (num_sims[first:last] + virtual_loss[first:last]) + EPSILON
+            values: np.ndarray = total_score[first:last] / n_i + explore_const * np.sqrt(log_N_i / n_i)
+            best = first + int(np.argmax(values))
+
+        virtual_loss[node] += 1
+        node = best
+
+    virtual_loss[node] += 1
+    return node
+
+ucb1_select = _ucb1_select_loop if NUMBA_AVAILABLE else _ucb1_select_vectorized
+
+@njit(cache=True, nogil=True)
+def backprop(node: int, value: float, parent: np.ndarray, total_score: np.ndarray, num_sims: np.ndarray, virtual_loss: np.ndarray) -> None:
+    '''
+    Add a simulation result to `node` and every one of its ancestors, removing the virtual losses added by selection.
+    Updates are not atomic; concurrent searches must not run this and ucb1_select at the same time.
+
+    Parameters:
+        node (int): Index of the node the simulation ran from.
+        value (float): Value of the simulation.
+        parent (np.ndarray): Tree.parent.
+        total_score (np.ndarray): Tree.total_score.
+        num_sims (np.ndarray): Tree.num_sims.
+        virtual_loss (np.ndarray): Tree.virtual_loss.
+    '''
+
+    while node != -1:
+        num_sims[node] += 1
+        total_score[node] += value
+        if virtual_loss[node] > 0:
+            virtual_loss[node] -= 1
+        node = parent[node]
\ No newline at end of file
@@ -1,77 +1,197 @@
 from mcts.state import State
+from typing import Callable, Iterator
+import random
+
+# Cell (i, j) of the board is bit `i * 3 + j` of a 9-bit bitboard.
+FULL_BOARD: int = 0o777
+# The three rows, three columns and two diagonals.
+WIN_MASKS: tuple[int, ...] = (0o007, 0o070, 0o700, 0o111, 0o222, 0o444, 0o421, 0o124)
+# Whether each of the 512 possible bitboards of one player's marks contains a winning line.
+WIN_TABLE: bytes = bytes(any(bitboard & mask == mask for mask in WIN_MASKS) for bitboard in range(FULL_BOARD + 1))
+# Maps cell bytes (see to_cells) to the symbol drawn for them.
+SYMBOLS: bytes = bytes.maketrans(b'\x00\x01\x02', b' XO')
+
+# Zobrist keys per player and cell; a board's hash is the XOR of the keys of its marks. Fixed seed so every process agrees.
+_zobrist_random: random.Random = random.Random(0)
+ZOBRIST: tuple[tuple[int, ...], ...] = tuple(tuple(_zobrist_random.getrandbits(64) for _ in range(9)) for _ in range(2))
+
+# (is terminal, winner) of boards already seen, by Zobrist hash. The oldest entry is evicted once the table is full.
+TRANSPOSITION_TABLE: dict[int, tuple[bool, int]] = {}
+TRANSPOSITION_TABLE_SIZE: int = 1 << 20
+
+# Children of states already expanded, by (Zobrist hash, player to move); same size limit and eviction as above.
+CHILDREN_TABLE: dict[tuple[int, int], list[State]] = {}
+
+# Whether to key TRANSPOSITION_TABLE by the board's symmetry class (see canonical_key) instead of its Zobrist hash,
+# so the 8 rotations and reflections of a board share one entry. Children are always kept per orientation.
+CANONICALIZE_SYMMETRY: bool = False
+
+def _build_symmetry(transform: Callable[[int, int], tuple[int, int]]) -> tuple[int, ...]:
+    # Map every 9-bit bitboard to its image when cell (i, j) moves to transform(i, j).
+    cell_bits: list[int] = [1 << (new_i * 3 + new_j) for new_i, new_j in (transform(cell // 3, cell % 3) for cell in range(9))]
+    return tuple(sum(cell_bits[cell] for cell in range(9) if bitboard >> cell & 1) for bitboard in range(FULL_BOARD + 1))
+
+# The four rotations, each with and without a reflection.
+SYMMETRIES: tuple[tuple[int, ...], ...] = tuple(_build_symmetry(transform) for transform in (
+    lambda i, j: (i, j), lambda i, j: (j, 2 - i), lambda i, j: (2 - i, 2 - j), lambda i, j: (2 - j, i),
+    lambda i, j: (i, 2 - j), lambda i, j: (j, i), lambda i, j: (2 - i, j), lambda i, j: (2 - j, 2 - i)
+))
+
+def zobrist_hash(representation: tuple[int, int]) -> int:
+    '''
+    Compute the Zobrist hash of a board from scratch.
+
+    Parameters:
+        representation (tuple[int, int]): The bitboards of player 1's and player 2's marks.
+
+    Returns:
+        int: The 64-bit Zobrist hash.
+    '''
+
+    key: int = 0
+    for player in range(2):
+        for cell in range(9):
+            if representation[player] >> cell & 1:
+                key ^= ZOBRIST[player][cell]
+
+    return key
+
+def to_cells(representation: tuple[int, int]) -> bytearray:
+    '''
+    Convert a board to a flat array of cells: cell (i, j) is byte `i * 3 + j`, holding 0 if empty or the player who marked it.
+
+    Parameters:
+        representation (tuple[int, int]): The bitboards of player 1's and player 2's marks.
+
+    Returns:
+        bytearray: The 9 cells.
+    '''
+
+    cells: bytearray = bytearray(9)
+    for player in range(2):
+        for cell in range(9):
+            if representation[player] >> cell & 1:
+                cells[cell] = player + 1
+
+    return cells
+
+def canonical_key(representation: tuple[int, int]) -> int:
+    '''
+    Get a key shared by a board and all of its rotations and reflections.
+
+    Parameters:
+        representation (tuple[int, int]): The bitboards of player 1's and player 2's marks.
+
+    Returns:
+        int: The smallest of the 8 transformed boards, packed as `bb_x << 9 | bb_o`.
+    '''
+
+    bb_x, bb_o = representation
+    return min(symmetry[bb_x] << 9 | symmetry[bb_o] for symmetry in SYMMETRIES)
 
 class TicTacToe(State):
-    def __init__(self, representation: list[list[int]]=[[0, 0, 0], [0, 0, 0], [0, 0, 0]], player: int=1):
-        super().__init__(representation, player)
-    
-    def get_next_states(self) -> set[State]:
-        moves: set[State] = set()
-
-        for i in range(len(self.representation)):
-            for j in range(len(self.representation[i])):
-                if self.representation[i][j] == 0:
-                    new_move: list[list[int]] = [row[:] for row in self.representation]
-                    new_move[i][j] = self.player
-                    moves.add(TicTacToe(new_move, 3 - self.player))
+    '''
+    A representation of a Tic-Tac-Toe game state.
+
+    Attributes:
+        representation (tuple[int, int]): The bitboards of player 1's (X) and player 2's (O) marks.
+        player (int): Which player's turn it currently is at this state.
+        last_move (int | None): The cell of the mark placed to reach this state, or None if unknown.
+        zobrist (int): Zobrist hash of this state.
+        is_terminal (bool): Whether this state is a terminal state or not.
+    '''
+
+    __slots__ = ('last_move', 'zobrist')
+
+    def __init__(self, representation: tuple[int, int] | None=None, player: int=1, last_move: int | None=None, zobrist: int | None=None):
+        if representation is None:
+            representation = (0, 0)
+        if zobrist is None:
+            zobrist = zobrist_hash(representation)
+        self.zobrist: int = zobrist
+
+        # Set before State.__init__, which already needs it to determine whether the state is terminal.
+        self.last_move: int | None = last_move
+        super().__init__(representation, player, 2)
+
+    def get_next_states(self) -> list[State]:
+        # States are immutable, so children are shared between every occurrence of a position. Do not modify the list.
+        key: tuple[int, int] = (self.zobrist, self.player)
+        moves: list[State] | None = CHILDREN_TABLE.get(key)
+        if moves is not None:
+            return moves
+
+        moves = list(self.iter_next_states())
+        if len(CHILDREN_TABLE) >= TRANSPOSITION_TABLE_SIZE:
+            del CHILDREN_TABLE[next(iter(CHILDREN_TABLE))]
+        CHILDREN_TABLE[key] = moves
 
         return moves
-    
-    def take_random_action(self) -> State:
-        return super().take_random_action()
-    
+
+    def iter_next_states(self) -> Iterator[State]:
+        # Lazily build the children, for callers which may stop early; get_next_states caches the full list.
+        if self.is_terminal:
+            return
+        bb_x, bb_o = self.representation
+        keys: tuple[int, ...] = ZOBRIST[self.player - 1]
+
+        # Visit exactly the empty cells by peeling off the lowest set bit.
+        empties: int = ~(bb_x | bb_o) & FULL_BOARD
+        if self.player == 1:
+            while empties:
+                bit: int = empties & -empties
+                empties ^= bit
+                cell: int = bit.bit_length() - 1
+                yield TicTacToe((bb_x | bit, bb_o), 2, cell, self.zobrist ^ keys[cell])
+        else:
+            while empties:
+                bit = empties & -empties
+                empties ^= bit
+                cell = bit.bit_length() - 1
+                yield TicTacToe((bb_x, bb_o | bit), 1, cell, self.zobrist ^ keys[cell])
+
     def calculate_value(self, player: int) -> float:
-        winner: int = 0
-        
-        for i in range(3):
-            if self.representation[i][0] == self.representation[i][1] == self.representation[i][2] != 0:
-                winner = self.representation[i][0]
-                break
-            if self.representation[0][i] == self.representation[1][i] == self.representation[2][i] != 0:
-                winner = self.representation[0][i]
-                break
-        if self.representation[0][0] == self.representation[1][1] == self.representation[2][2] != 0:
-            winner = self.representation[0][0]
-        elif self.representation[0][2] == self.representation[1][1] == self.representation[2][0] != 0:
-            winner = self.representation[0][2]
-
-        if winner == player:
+        if self._outcome()[1] == player:
             return 1.0
         return 0.0
-    
+
     def is_terminal_state(self) -> bool:
-        # Check rows, columns, and diagonals
-        for i in range(3):
-            if self.representation[i][0] == self.representation[i][1] == self.representation[i][2] != 0:
-                return True
-            if self.representation[0][i] == self.representation[1][i] == self.representation[2][i] != 0:
-                return True
-        if self.representation[0][0] == self.representation[1][1] == self.representation[2][2] != 0:
-            return True
-        if self.representation[0][2] == self.representation[1][1] == self.representation[2][0] != 0:
-            return True
-        
-        # Check if the board is full
-        return all(0 not in row for row in self.representation)
+        return self._outcome()[0]
+
+    def _outcome(self) -> tuple[bool, int]:
+        # Whether the state is terminal and who won, from the transposition table when the board has been seen before.
+        key: int = canonical_key(self.representation) if CANONICALIZE_SYMMETRY else self.zobrist
+        outcome: tuple[bool, int] | None = TRANSPOSITION_TABLE.get(key)
+        if outcome is None:
+            # Check rows, columns, and diagonals, then whether the board is full
+            winner: int = self._winner()
+            bb_x, bb_o = self.representation
+            outcome = (winner != 0 or bb_x | bb_o == FULL_BOARD, winner)
+
+            if len(TRANSPOSITION_TABLE) >= TRANSPOSITION_TABLE_SIZE:
+                del TRANSPOSITION_TABLE[next(iter(TRANSPOSITION_TABLE))]
+            TRANSPOSITION_TABLE[key] = outcome
+
+        return outcome
+
+    def _winner(self) -> int:
+        # The player with three in a row, or 0 if there is none.
+        if self.last_move is not None:
+            # Play stops at a win, so only the player who just moved can have won.
+            mover: int = 3 - self.player
+            return mover if WIN_TABLE[self.representation[mover - 1]] else 0
+
+        bb_x, bb_o = self.representation
+        if WIN_TABLE[bb_x]:
+            return 1
+        if WIN_TABLE[bb_o]:
+            return 2
+
+        return 0
+
+    def __hash__(self) -> int:
+        return self.zobrist
 
     def __str__(self) -> str:
-        grid: list[list[str]] = []
-
-        for row in self.representation:
-            new_row: list[str] = []
-            for val in row:
-                if val == 0:
-                    new_row.append(' ')
-                elif val == 1:
-                    new_row.append('X')
-                elif val == 2:
-                    new_row.append('O')
-            
-            grid.append(new_row)
-        
-        output: str = ''
-        for i, row in enumerate(grid):
-            output += ' ' + ' | '.join([symbol for symbol in row]) + ' \n'
-            if i < len(grid) - 1:
-                output += '-----------\n'
-        
-        return output
+        symbols: str = to_cells(self.representation).translate(SYMBOLS).decode()
+        return f' {symbols[0]} | {symbols[1]} | {symbols[2]} \n-----------\n {symbols[3]} | {symbols[4]} | {symbols[5]} \n-----------\n {symbols[6]} | {symbols[7]} | {symbols[8]} \n'
\ No newline at end of file